@@ -4,90 +4,71 @@ WebSocket handshake test
 Tests that the server properly performs RFC 6455 WebSocket handshake
 """
 
-import socket
-import base64
-import hashlib
+from ws_test_common import (
+    HOST, PORT, REQ_PREFIX, REQ_SUFFIX, WS_KEY, EXPECTED_ACCEPT,
+    open_client_socket, parse_headers, read_http_response,
+)
 
 def test_websocket_handshake():
     # Connect to server
-    print("Connecting to localhost:8080...")
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5.0)
-    sock.connect(('localhost', 8080))
+    print(f"Connecting to {HOST}:{PORT}...")
+    sock = open_client_socket(5.0)
+    sock.connect((HOST, PORT))
     print("✓ TCP connection established")
     
-    # Generate WebSocket key
-    ws_key = base64.b64encode(b'test_key_1234567').decode('ascii')
+    # WebSocket key
+    ws_key = WS_KEY
     print(f"\nWebSocket-Key: {ws_key}")
     
     # Send WebSocket upgrade request
-    request = (
-        f"GET /ws HTTP/1.1\r\n"
-        f"Host: localhost:8080\r\n"
-        f"Upgrade: websocket\r\n"
-        f"Connection: Upgrade\r\n"
-        f"Sec-WebSocket-Key: {ws_key}\r\n"
-        f"Sec-WebSocket-Version: 13\r\n"
-        f"\r\n"
-    )
+    request = REQ_PREFIX + ws_key.encode('ascii') + REQ_SUFFIX
     
     print("\nSending handshake request:")
-    print(request.replace('\r\n', '\\r\\n\n'))
+    print(request.decode('ascii').replace('\r\n', '\\r\\n\n'))
     
-    sock.sendall(request.encode())
+    sock.sendall(request)
     
     # Receive response
-    response = sock.recv(4096).decode('ascii')
+    response, _ = read_http_response(sock)
     print("Received response:")
-    print(response.replace('\r\n', '\\r\\n\n'))
-    
-    # Parse response
-    lines = response.split('\r\n')
-    status_line = lines[0]
+    print(response.decode('ascii', 'replace').replace('\r\n', '\\r\\n\n'))
     
     # Check status
-    if '101' in status_line and 'Switching Protocols' in status_line:
+    if response.startswith(b'HTTP/1.1 101 '):
         print("\n✓ Status: 101 Switching Protocols")
     else:
-        print(f"\n❌ Invalid status: {status_line}")
+        status_line = response.partition(b'\r\n')[0]
+        print(f"\n❌ Invalid status: {status_line.decode('ascii', 'replace')}")
         sock.close()
         return False
     
     # Check headers
-    headers = {}
-    for line in lines[1:]:
-        if ':' in line:
-            key, value = line.split(':', 1)
-            headers[key.strip().lower()] = value.strip()
+    headers = parse_headers(response)
     
     # Verify required headers
-    if headers.get('upgrade', '').lower() != 'websocket':
+    if headers.get(b'upgrade', b'').lower() != b'websocket':
         print("❌ Missing or invalid Upgrade header")
         sock.close()
         return False
     print("✓ Upgrade: websocket")
     
-    if headers.get('connection', '').lower() != 'upgrade':
+    if headers.get(b'connection', b'').lower() != b'upgrade':
         print("❌ Missing or invalid Connection header")
         sock.close()
         return False
     print("✓ Connection: Upgrade")
     
     # Verify Sec-WebSocket-Accept
-    if 'sec-websocket-accept' in headers:
-        expected_accept = base64.b64encode(
-            hashlib.sha1(
-                (ws_key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()
-            ).digest()
-        ).decode('ascii')
+    if b'sec-websocket-accept' in headers:
+        expected_accept = EXPECTED_ACCEPT
         
-        actual_accept = headers['sec-websocket-accept']
+        actual_accept = headers[b'sec-websocket-accept']
         if actual_accept == expected_accept:
-            print(f"✓ Sec-WebSocket-Accept: {actual_accept} (valid)")
+            print(f"✓ Sec-WebSocket-Accept: {actual_accept.decode('ascii')} (valid)")
         else:
             print(f"❌ Invalid Sec-WebSocket-Accept")
-            print(f"   Expected: {expected_accept}")
-            print(f"   Actual:   {actual_accept}")
+            print(f"   Expected: {expected_accept.decode('ascii')}")
+            print(f"   Actual:   {actual_accept.decode('ascii', 'replace')}")
             sock.close()
             return False
     else:
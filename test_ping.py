@@ -4,47 +4,76 @@ WebSocket ping test client
 Tests the server's ping/pong functionality
 """
 
-import asyncio
-import websockets
+import socket
+import struct
 import sys
+import time
 
-async def test_ping():
-    uri = "ws://localhost:8080/ws"
-    
+from ws_test_common import (
+    OP_TEXT, OP_CLOSE, OP_PING, OP_PONG, FrameReader, HandshakeError,
+    connect_and_upgrade, send_ws_frame,
+)
+
+# Number of pings pipelined in Test 4
+PING_COUNT = 3
+
+def test_ping():
     try:
         print("Connecting to WebSocket server...")
-        async with websockets.connect(uri) as websocket:
-            print("✓ Connected successfully")
-            
-            # Test 1: Send a text message
-            print("\n[Test 1] Sending text message...")
-            await websocket.send("Hello, WebSocket!")
-            response = await websocket.recv()
-            print(f"✓ Received echo: {response}")
-            
-            # Test 2: Test ping/pong
-            print("\n[Test 2] Testing ping/pong...")
-            pong_waiter = await websocket.ping()
-            latency = await pong_waiter
-            print(f"✓ Pong received! Latency: {latency:.3f}s")
-            
-            # Test 3: Send another message
-            print("\n[Test 3] Sending another message...")
-            await websocket.send("Testing after ping")
-            response = await websocket.recv()
-            print(f"✓ Received echo: {response}")
-            
-            # Test 4: Multiple pings
-            print("\n[Test 4] Sending multiple pings...")
-            for i in range(3):
-                pong_waiter = await websocket.ping()
-                latency = await pong_waiter
-                print(f"  Ping {i+1}: {latency:.3f}s")
-            print("✓ All pongs received!")
-            
-            print("\n✅ All tests passed!")
-            
-    except websockets.exceptions.ConnectionClosed as e:
+        sock, rest = connect_and_upgrade()
+        reader = FrameReader(sock, rest)
+        print("✓ Connected successfully")
+        
+        # Test 1: Send a text message
+        print("\n[Test 1] Sending text message...")
+        send_ws_frame(sock, OP_TEXT, b"Hello, WebSocket!")
+        response = reader.expect(OP_TEXT)
+        print(f"✓ Received echo: {response.decode('utf-8', 'replace')}")
+        
+        # Test 2: Test ping/pong
+        print("\n[Test 2] Testing ping/pong...")
+        start = time.perf_counter()
+        send_ws_frame(sock, OP_PING, b"ping")
+        reader.expect(OP_PONG)
+        latency = time.perf_counter() - start
+        print(f"✓ Pong received! Latency: {latency:.3f}s")
+        
+        # Test 3: Send another message
+        print("\n[Test 3] Sending another message...")
+        send_ws_frame(sock, OP_TEXT, b"Testing after ping")
+        response = reader.expect(OP_TEXT)
+        print(f"✓ Received echo: {response.decode('utf-8', 'replace')}")
+        
+        # Test 4: Multiple pings, sent back to back so the server sees
+        # them pipelined rather than one per round trip. Each ping carries
+        # its index so pongs can be matched to send times.
+        print("\n[Test 4] Sending multiple pings...")
+        sent_at = []
+        for i in range(PING_COUNT):
+            sent_at.append(time.perf_counter())
+            send_ws_frame(sock, OP_PING, struct.pack('>I', i))
+        latencies = [None] * PING_COUNT
+        for _ in range(PING_COUNT):
+            i = struct.unpack('>I', reader.expect(OP_PONG))[0]
+            latencies[i] = time.perf_counter() - sent_at[i]
+        for i, latency in enumerate(latencies):
+            print(f"  Ping {i+1}: {latency:.3f}s")
+        print("✓ All pongs received!")
+        
+        # Close handshake: status 1000 (normal closure)
+        send_ws_frame(sock, OP_CLOSE, struct.pack('>H', 1000))
+        try:
+            reader.read_frame()
+        except (ConnectionError, socket.timeout):
+            pass
+        sock.close()
+        
+        print("\n✅ All tests passed!")
+    
+    except HandshakeError as e:
+        print(f"❌ {e}")
+        return 1
+    except ConnectionError as e:
         print(f"❌ Connection closed: {e}")
         return 1
     except Exception as e:
@@ -54,5 +83,5 @@ async def test_ping():
     return 0
 
 if __name__ == "__main__":
-    exit_code = asyncio.run(test_ping())
+    exit_code = test_ping()
     sys.exit(exit_code)
@@ -0,0 +1,361 @@
+"""
+Shared helpers for the WebSocket test scripts
+Handshake, framing and response parsing used by test_basic_ws.py,
+test_handshake.py and test_ping.py
+"""
+
+import socket
+import base64
+import functools
+import hashlib
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HOST = 'localhost'
+PORT = 8080
+
+# WebSocket opcodes (RFC 6455)
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Upgrade request, fixed apart from the Sec-WebSocket-Key value
+REQ_PREFIX = (
+    b"GET /ws HTTP/1.1\r\n"
+    b"Host: %s:%d\r\n"
+    b"Upgrade: websocket\r\n"
+    b"Connection: Upgrade\r\n"
+    b"Sec-WebSocket-Key: "
+) % (HOST.encode('ascii'), PORT)
+REQ_SUFFIX = (
+    b"\r\n"
+    b"Sec-WebSocket-Version: 13\r\n"
+    b"\r\n"
+)
+
+# Socket buffer size for the client connection, comfortably larger than
+# any frame the tests send
+SOCK_BUF_SIZE = 256 * 1024
+
+# Payloads at least this large are handed to the kernel as a separate
+# buffer with sendmsg() rather than copied into the frame
+SENDMSG_THRESHOLD = 4096
+
+# Without NumPy, payloads at least this long are masked with one big-int
+# XOR; shorter ones aren't worth the conversions
+SWAR_MIN_LEN = 64
+
+# Sec-WebSocket-Key is base64 of 16 bytes (24 chars), so key + GUID is a
+# fixed 60-byte message; keep the GUID in place and only copy the key in
+_accept_buf = bytearray(24) + WS_GUID
+
+# SHA-1 runs over key + GUID with the key first, so there is no shared
+# prefix to checkpoint a hash state at; cache whole results instead
+@functools.lru_cache(maxsize=1024)
+def ws_accept(key_b64):
+    """Compute the Sec-WebSocket-Accept value for a Sec-WebSocket-Key
+    (bytes)"""
+    if len(key_b64) == 24:
+        _accept_buf[:24] = key_b64
+        digest = hashlib.sha1(_accept_buf).digest()
+    else:
+        digest = hashlib.sha1(key_b64 + WS_GUID).digest()
+    return base64.b64encode(digest)
+
+# The tests always use the same key, so its accept value is fixed too
+WS_KEY = base64.b64encode(b'test_key_1234567').decode('ascii')
+EXPECTED_ACCEPT = ws_accept(WS_KEY.encode('ascii'))
+
+class HandshakeError(Exception):
+    """Raised when the server doesn't answer the upgrade request with
+    101 Switching Protocols"""
+    
+    def __init__(self, head):
+        status_line = head.partition(b'\r\n')[0]
+        super().__init__(f"handshake failed: {status_line.decode('ascii', 'replace')}")
+        self.head = head
+
+def open_client_socket(timeout):
+    """Create a TCP socket with Nagle disabled and fixed buffer sizes.
+    
+    The options are set before connect() so the receive buffer size is
+    taken into account for the TCP window negotiated in the handshake."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCK_BUF_SIZE)
+    sock.settimeout(timeout)
+    return sock
+
+def read_http_response(sock):
+    """Read an HTTP response head, stopping at the blank line that ends it.
+    
+    Returns (head, rest): head includes the terminating blank line, rest
+    is whatever arrived after it (e.g. a WebSocket frame the server sent
+    straight after the handshake)."""
+    buf = bytearray()
+    end = -1
+    while end == -1:
+        chunk = sock.recv(1024)
+        if not chunk:
+            return bytes(buf), b''
+        start = max(0, len(buf) - 3)
+        buf += chunk
+        end = buf.find(b'\r\n\r\n', start)
+    end += 4
+    return bytes(buf[:end]), bytes(buf[end:])
+
+def parse_headers(resp):
+    """Parse the header lines of a raw HTTP response into a dict
+    mapping lowercased header names to values, both as bytes"""
+    headers = {}
+    pos = resp.find(b'\r\n')
+    if pos == -1:
+        return headers
+    pos += 2
+    while True:
+        eol = resp.find(b'\r\n', pos)
+        if eol == -1 or eol == pos:
+            break
+        colon = resp.find(b':', pos, eol)
+        if colon != -1:
+            headers[resp[pos:colon].strip().lower()] = resp[colon + 1:eol].strip()
+        pos = eol + 2
+    return headers
+
+def read_headers(sock):
+    """Read an HTTP response head and parse its headers.
+    
+    Returns (headers, rest) as for parse_headers() and
+    read_http_response()."""
+    head, rest = read_http_response(sock)
+    return parse_headers(head), rest
+
+def upgrade(sock, ws_key=WS_KEY):
+    """Perform the WebSocket handshake on a connected socket.
+    
+    Returns any bytes received after the response head. Raises
+    HandshakeError if the server doesn't switch protocols."""
+    sock.sendall(REQ_PREFIX + ws_key.encode('ascii') + REQ_SUFFIX)
+    head, rest = read_http_response(sock)
+    if not head.startswith(b'HTTP/1.1 101 '):
+        raise HandshakeError(head)
+    return rest
+
+def connect_and_upgrade(timeout=5.0):
+    """Connect to the test server and perform the WebSocket handshake.
+    
+    Returns (sock, rest) where rest holds any frame bytes received
+    with the handshake response."""
+    sock = open_client_socket(timeout)
+    try:
+        sock.connect((HOST, PORT))
+        rest = upgrade(sock)
+    except BaseException:
+        sock.close()
+        raise
+    return sock, rest
+
+if np is not None and njit is not None:
+    @njit(cache=True, boundscheck=False)
+    def mask_inplace(buf, key):
+        """XOR a uint8 buffer with a 4-byte uint8 key, in place"""
+        for i in range(buf.shape[0]):
+            buf[i] ^= key[i & 3]
+    
+    # Compile now so the first frame sent doesn't pay the JIT cost
+    mask_inplace(np.zeros(4, dtype=np.uint8),
+                 np.frombuffer(bytes(4), dtype=np.uint8))
+else:
+    mask_inplace = None
+
+def _mask_swar(payload, key4):
+    """Mask payload by XOR-ing it against the tiled key as one integer,
+    which CPython does a machine word at a time"""
+    n = len(payload)
+    tiled = (key4 * ((n + 3) // 4))[:n]
+    return (int.from_bytes(payload, 'big') ^
+            int.from_bytes(tiled, 'big')).to_bytes(n, 'big')
+
+def mask_buffer(buf, mask_key):
+    """Apply the RFC 6455 XOR mask to a writable buffer, in place"""
+    n = len(buf)
+    if n == 0:
+        return
+    
+    if mask_inplace is not None:
+        mask_inplace(np.frombuffer(buf, dtype=np.uint8),
+                     np.frombuffer(mask_key, dtype=np.uint8))
+        return
+    
+    if np is None:
+        if n >= SWAR_MIN_LEN:
+            buf[:] = _mask_swar(buf, mask_key)
+        else:
+            for i in range(n):
+                buf[i] ^= mask_key[i % 4]
+        return
+    
+    # XOR whole 64-bit words with the key tiled twice, then the tail
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    key = mask_key * 2
+    whole = n & ~7
+    if whole:
+        arr[:whole].view(np.uint64)[:] ^= np.frombuffer(key, dtype=np.uint64)
+    if whole < n:
+        arr[whole:] ^= np.frombuffer(key[:n - whole], dtype=np.uint8)
+
+def sendmsg_all(sock, buffers):
+    """Like sendall(), but for a list of buffers sent with sendmsg()"""
+    views = [memoryview(b) for b in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if views and sent:
+            views[0] = views[0][sent:]
+
+class Framer:
+    """Builds masked client frames in a buffer reused across sends"""
+    
+    # FIN/opcode + mask/length + 64-bit extended length + masking key
+    MAX_HEADER_LEN = 14
+    
+    def __init__(self, capacity=65536, mask_key=b'\x12\x34\x56\x78'):
+        self.mask_key = mask_key
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._hdr = bytearray(self.MAX_HEADER_LEN)
+        self._hdr_view = memoryview(self._hdr)
+    
+    def _pack_header(self, buf, opcode, payload_len):
+        """Write the frame header and masking key to the start of buf,
+        returning the number of bytes written"""
+        # Client frames must be masked (RFC 6455)
+        mask_bit = 0x80
+        if payload_len < 126:
+            struct.pack_into('>BB4s', buf, 0, 0x80 | opcode,
+                             mask_bit | payload_len, self.mask_key)
+            return 6
+        if payload_len < 65536:
+            struct.pack_into('>BBH4s', buf, 0, 0x80 | opcode,
+                             mask_bit | 126, payload_len, self.mask_key)
+            return 8
+        struct.pack_into('>BBQ4s', buf, 0, 0x80 | opcode,
+                         mask_bit | 127, payload_len, self.mask_key)
+        return 14
+    
+    def send(self, sock, opcode, payload):
+        """Send a WebSocket frame"""
+        payload_len = len(payload)
+        
+        # Large payload: send header and masked payload in one sendmsg()
+        # call instead of copying the payload into the frame buffer
+        if payload_len >= SENDMSG_THRESHOLD and hasattr(sock, 'sendmsg'):
+            self.send_owned(sock, opcode, bytearray(payload))
+            return
+        
+        # Grow the buffer to the new high-water mark if the frame
+        # might not fit
+        if payload_len + self.MAX_HEADER_LEN > len(self._buf):
+            self._view.release()
+            self._buf = bytearray(payload_len + self.MAX_HEADER_LEN)
+            self._view = memoryview(self._buf)
+        
+        header_len = self._pack_header(self._buf, opcode, payload_len)
+        frame_len = header_len + payload_len
+        
+        # Copy the payload straight into the frame and mask it there
+        body = self._view[header_len:frame_len]
+        body[:] = payload
+        mask_buffer(body, self.mask_key)
+        
+        sock.sendall(self._view[:frame_len])
+    
+    def send_owned(self, sock, opcode, payload):
+        """Send a WebSocket frame whose payload is a writable buffer the
+        caller hands over.
+        
+        The payload is masked in place and passed to sendmsg() next to the
+        header, so it is never copied; its contents are undefined after
+        the call. Falls back to send() if the socket has no sendmsg()."""
+        if not hasattr(sock, 'sendmsg'):
+            self.send(sock, opcode, payload)
+            return
+        
+        header_len = self._pack_header(self._hdr, opcode, len(payload))
+        mask_buffer(payload, self.mask_key)
+        sendmsg_all(sock, [self._hdr_view[:header_len], payload])
+
+_framer = Framer()
+
+def send_ws_frame(sock, opcode, payload):
+    """Send a WebSocket frame, copying the payload"""
+    _framer.send(sock, opcode, payload)
+
+def send_ws_frame_owned(sock, opcode, payload):
+    """Send a WebSocket frame, masking the writable payload buffer in
+    place (see Framer.send_owned)"""
+    _framer.send_owned(sock, opcode, payload)
+
+class FrameReader:
+    """Reads WebSocket frames from a socket, starting with any bytes left
+    over from the handshake"""
+    
+    def __init__(self, sock, initial=b''):
+        self.sock = sock
+        self._buf = bytearray(initial)
+    
+    def _fill(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("connection closed by server")
+            self._buf += chunk
+    
+    def read_frame(self):
+        """Read one frame, returning (opcode, payload)"""
+        self._fill(2)
+        opcode = self._buf[0] & 0x0F
+        payload_len = self._buf[1] & 0x7F
+        masked = self._buf[1] & 0x80
+        pos = 2
+        if payload_len == 126:
+            self._fill(4)
+            payload_len = struct.unpack_from('>H', self._buf, 2)[0]
+            pos = 4
+        elif payload_len == 127:
+            self._fill(10)
+            payload_len = struct.unpack_from('>Q', self._buf, 2)[0]
+            pos = 10
+        if masked:
+            self._fill(pos + 4)
+            mask_key = bytes(self._buf[pos:pos + 4])
+            pos += 4
+        
+        self._fill(pos + payload_len)
+        payload = self._buf[pos:pos + payload_len]
+        del self._buf[:pos + payload_len]
+        if masked:
+            mask_buffer(payload, mask_key)
+        return opcode, bytes(payload)
+    
+    def expect(self, opcode):
+        """Read a frame and check its opcode, returning the payload"""
+        got, payload = self.read_frame()
+        if got != opcode:
+            raise ValueError(f"expected opcode 0x{opcode:x}, got 0x{got:x}")
+        return payload